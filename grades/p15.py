@@ -22,16 +22,39 @@ Salida:
 
 Uso:
 python3 grades/p15.py
+python3 grades/p15.py --static          # todo salvo C3 (sin mvn test), nota parcial
+python3 grades/p15.py --only C1,C4       # solo los criterios indicados, nota parcial
+python3 grades/p15.py --batch repos.txt [--plantilla URL] [--jobs N] [--cache DIR]
+
+Modo lote (--batch): cada línea del fichero es "URL" o "usuario URL" (la URL
+puede ser un repositorio bare local). Los repositorios se mantienen en una
+caché de espejos bare que comparten un único almacén de objetos (git
+alternates), se actualizan con fetch incremental en paralelo y se evalúan en
+worktrees ligeros. Todas las filas se escriben en resultados.csv.
+
+Límites por repositorio (--max-file-kb, --max-total-mb, --max-entries,
+--criterion-timeout): los archivos o árboles que los superan se leen o
+recorren parcialmente y se indica en los comentarios. En modo lote un
+watchdog (--worker-timeout) cancela la evaluación de un alumno sin detener
+al resto.
 """
 
 import os
 import re
 import sys
 import csv
+import json
+import shutil
+import time
+import fnmatch
+import signal
+import struct
+import argparse
 import xml.etree.ElementTree as ET
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional, Set
+from typing import Callable, Dict, List, Tuple, Optional, Set
 
 EXCLUDED_DIRS = {
     ".git",
@@ -41,9 +64,33 @@ EXCLUDED_DIRS = {
     "target",
     "grades",
     "ejemplos",
+    ".p15_cache",
 }
 
 PRACTICA = "P15"
+BATCH_CACHE_DIR = ".p15_cache"
+CSV_HEADERS = ["Usuario GitHub", "Practica", "Nota", "Comentarios"]
+
+# Límites de recursos por repositorio (configurables desde la línea de comandos)
+KB = 1024
+MB = 1024 * KB
+
+LIMITS = {
+    "max_file_bytes": 1 * MB,        # mayor -> se lee solo el comienzo del archivo
+    "max_total_bytes": 50 * MB,      # bytes leídos en total por repositorio
+    "max_entries": 20_000,           # archivos + directorios recorridos en total por repositorio
+    "criterion_seconds": 180,        # tiempo por criterio (incluye mvn test en C3)
+    "worker_seconds": 900,           # watchdog del proceso de cada alumno en modo lote
+}
+
+# Estado del presupuesto de la evaluación en curso (acumulado por repositorio)
+_scan_state = {"bytes_read": 0, "entries_visited": 0, "deadline": None, "repo_root": None}
+RESOURCE_ISSUES: List[str] = []
+
+# Cada directorio se lista y cada archivo se lee una sola vez por repositorio:
+# los criterios que vuelven sobre ellos no consumen presupuesto de nuevo
+_dir_listings: Dict[str, Tuple[List[str], List[str]]] = {}
+_file_contents: Dict[str, str] = {}
 
 # ------------------------------ utilidades ------------------------------
 
@@ -51,13 +98,21 @@ def get_repo_root() -> Path:
     return Path(os.getcwd())
 
 def extract_github_user() -> str:
+    # El modo lote fija el usuario explícitamente para cada worktree
+    forced_user = os.getenv("P15_USUARIO", "")
+    if forced_user:
+        return forced_user
+
     repo_name = os.getenv("GITHUB_REPOSITORY", "") # owner/repo
     if repo_name:
         repo_short = repo_name.split("/")[-1]
     else:
         repo_short = os.path.basename(os.getcwd())
-    
-    # Limpieza de prefijos habituales para P15
+
+    return clean_repo_name(repo_short)
+
+def clean_repo_name(repo_short: str) -> str:
+    """Limpieza de prefijos habituales para P15"""
     cleaned = re.sub(r"(?i)^(DIS|dis)[_-]?p15[_-]?", "", repo_short)
     cleaned = re.sub(r"(?i)^p15[_-]?", "", cleaned)
     return cleaned or repo_short or "desconocido"
@@ -73,31 +128,141 @@ def write_csv_row(path: str, headers: List[str], row: List[str], append: bool =
             w.writerow(headers)
         w.writerow(row)
 
+def note_resource_issue(message: str):
+    """Registra un límite alcanzado para mostrarlo en los comentarios"""
+    if message not in RESOURCE_ISSUES:
+        RESOURCE_ISSUES.append(message)
+
+def start_criterion_budget():
+    """Reinicia el límite de tiempo para el siguiente criterio"""
+    _scan_state["deadline"] = time.monotonic() + LIMITS["criterion_seconds"]
+
+def time_budget_exceeded() -> bool:
+    deadline = _scan_state["deadline"]
+    return deadline is not None and time.monotonic() > deadline
+
+def criterion_time_up(where: str) -> bool:
+    """Comprueba el límite de tiempo del criterio y, si se ha agotado, lo registra"""
+    if time_budget_exceeded():
+        note_resource_issue(f"análisis de {where} cortado por tiempo ({LIMITS['criterion_seconds']} s)")
+        return True
+    return False
+
+def remaining_criterion_seconds() -> float:
+    """Segundos que le quedan al criterio en curso (para timeouts de subprocesos)"""
+    deadline = _scan_state["deadline"]
+    if deadline is None:
+        return float(LIMITS["criterion_seconds"])
+    return max(1.0, deadline - time.monotonic())
+
+def display_path(path: Path) -> str:
+    """Ruta relativa a la raíz del repositorio evaluado, para los mensajes"""
+    repo_root = _scan_state["repo_root"]
+    try:
+        return Path(os.path.abspath(path)).relative_to(repo_root).as_posix()
+    except (TypeError, ValueError):
+        return path.name
+
+def list_dir_cached(dirpath: Path) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Devuelve (subdirectorios, archivos) de un directorio, listándolo solo la primera vez.
+    Las entradas nuevas cuentan contra LIMITS["max_entries"]; None si ya no caben.
+    Los enlaces simbólicos a directorios no se incluyen (no se siguen).
+    """
+    key = os.path.abspath(dirpath)
+    if key in _dir_listings:
+        return _dir_listings[key]
+
+    dirnames: List[str] = []
+    filenames: List[str] = []
+    try:
+        with os.scandir(key) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirnames.append(entry.name)
+                elif not entry.is_dir():
+                    filenames.append(entry.name)
+    except OSError:
+        pass
+
+    if _scan_state["entries_visited"] + len(dirnames) + len(filenames) > LIMITS["max_entries"]:
+        return None
+    _scan_state["entries_visited"] += len(dirnames) + len(filenames)
+
+    listing = (sorted(dirnames), sorted(filenames))
+    _dir_listings[key] = listing
+    return listing
+
 def find_files_by_pattern(root: Path, patterns: List[str], exclude_dirs: Optional[Set[str]] = None) -> List[Path]:
-    """Busca archivos que coincidan con patrones específicos"""
+    """
+    Busca archivos que coincidan con patrones específicos.
+    Poda los directorios excluidos sin recorrerlos, no sigue enlaces simbólicos y
+    se detiene al agotar LIMITS["max_entries"] (cada entrada cuenta una vez por
+    repositorio) o el tiempo del criterio.
+    """
     excluded = exclude_dirs or EXCLUDED_DIRS
+    # Los patrones "**/*.java" equivalen a buscar "*.java" en todo el árbol
+    name_patterns = [pattern.split("/")[-1] for pattern in patterns]
     found: List[Path] = []
-    for pattern in patterns:
-        for path in root.rglob(pattern):
-            if any(part in excluded for part in path.parts):
-                continue
-            found.append(path)
+
+    # Recorrido en profundidad, en el mismo orden que os.walk con nombres ordenados
+    pending = [root]
+    while pending:
+        dirpath = pending.pop()
+        if criterion_time_up(f"{display_path(root)}/"):
+            break
+        listing = list_dir_cached(dirpath)
+        if listing is None:
+            note_resource_issue(
+                f"límite de {LIMITS['max_entries']} entradas recorridas alcanzado en {display_path(dirpath)}/"
+            )
+            break
+
+        dirnames, filenames = listing
+        for name in filenames:
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in name_patterns):
+                found.append(dirpath / name)
+        pending.extend(dirpath / d for d in reversed(dirnames) if d not in excluded)
     return found
 
 def read_file_safe(path: Path) -> str:
-    """Lee un archivo de forma segura"""
+    """
+    Lee un archivo de forma segura.
+    Los archivos mayores que LIMITS["max_file_bytes"] se leen solo parcialmente y,
+    agotado el presupuesto de bytes del repositorio, no se lee nada más.
+    El contenido se guarda, así que releer un archivo no consume presupuesto.
+    """
+    key = os.path.abspath(path)
+    if key in _file_contents:
+        return _file_contents[key]
+
     try:
-        # Intentar primero UTF-8
-        return path.read_text(encoding="utf-8")
-    except UnicodeDecodeError:
-        try:
-            # Si falla, intentar con latin-1
-            return path.read_text(encoding="latin-1")
-        except Exception:
+        remaining = LIMITS["max_total_bytes"] - _scan_state["bytes_read"]
+        if remaining <= 0:
+            note_resource_issue(f"límite de {LIMITS['max_total_bytes'] // MB} MB leídos alcanzado")
             return ""
+
+        size = path.stat().st_size
+        limit = min(LIMITS["max_file_bytes"], remaining)
+        if size > limit:
+            note_resource_issue(f"{display_path(path)} ({size // KB} KB) leído parcialmente, máx. {limit // KB} KB")
+
+        with open(path, "rb") as f:
+            data = f.read(limit)
+        _scan_state["bytes_read"] += len(data)
     except Exception:
         return ""
 
+    try:
+        # Intentar primero UTF-8
+        content = data.decode("utf-8")
+    except UnicodeDecodeError:
+        # Si falla, intentar con latin-1
+        content = data.decode("latin-1")
+
+    _file_contents[key] = content
+    return content
+
 def validate_evidence_name(img_name: str, expected_name: str) -> bool:
     """
     Valida si el nombre de imagen coincide con el esperado.
@@ -123,6 +288,144 @@ def validate_evidence_name(img_name: str, expected_name: str) -> bool:
     
     return normalized_img == normalized_expected or normalized_img.startswith(normalized_expected + '_')
 
+def parse_image_header(header: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Identifica el formato por su firma y extrae (formato, ancho, alto) de la cabecera
+    sin decodificar la imagen. JPEG devuelve dimensiones 0: se leen aparte (ver read_jpeg_size).
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n") and header[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", header[16:24])
+        return "png", width, height
+
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", header[6:10])
+        return "gif", width, height
+
+    if header.startswith(b"BM") and len(header) >= 26:
+        width, height = struct.unpack("<ii", header[18:26])
+        return "bmp", abs(width), abs(height)
+
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP" and len(header) >= 30:
+        chunk = header[12:16]
+        if chunk == b"VP8X":
+            width = int.from_bytes(header[24:27], "little") + 1
+            height = int.from_bytes(header[27:30], "little") + 1
+            return "webp", width, height
+        if chunk == b"VP8L" and header[20] == 0x2F:
+            bits = int.from_bytes(header[21:25], "little")
+            return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8 " and header[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack("<HH", header[26:30])
+            return "webp", width & 0x3FFF, height & 0x3FFF
+
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg", 0, 0
+
+    return None
+
+# Marcadores JPEG sin campo de longitud: TEM, RST0..RST7 y SOI
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8), 0xD8}
+
+def read_jpeg_size(f, max_segments: int = 64, max_fill: int = 1024) -> Optional[Tuple[int, int]]:
+    """Recorre las cabeceras de segmento JPEG (saltando su contenido) hasta el marcador SOF"""
+    f.seek(2)
+    for _ in range(max_segments):
+        if f.read(1) != b"\xff":
+            return None
+        # El estándar permite bytes de relleno 0xFF antes del código del marcador
+        code = 0xFF
+        for _ in range(max_fill):
+            byte = f.read(1)
+            if not byte:
+                return None
+            code = byte[0]
+            if code != 0xFF:
+                break
+        else:
+            return None
+
+        if code in JPEG_STANDALONE_MARKERS:
+            continue
+        if code == 0xD9:  # EOI sin haber encontrado SOF
+            return None
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        # SOF0..SOF15 salvo DHT (C4), JPG (C8) y DAC (CC)
+        if 0xC0 <= code <= 0xCF and code not in (0xC4, 0xC8, 0xCC):
+            sof = f.read(5)
+            if len(sof) < 5:
+                return None
+            height, width = struct.unpack(">HH", sof[1:5])
+            return width, height
+        if length < 2:
+            return None
+        f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+# (dispositivo, inodo, mtime, tamaño) -> (formato, ancho, alto) o None si no es una imagen válida
+_IMAGE_INFO_CACHE: Dict[Tuple[int, int, int, int], Optional[Tuple[str, int, int]]] = {}
+_image_keys_used: Set[Tuple[int, int, int, int]] = set()
+
+# Fichero JSON donde persiste la caché entre ejecuciones (lo fija el modo lote)
+IMAGE_CACHE_ENV = "P15_IMAGE_CACHE"
+
+def load_image_cache():
+    """Carga la caché persistente de imágenes, si la hay"""
+    cache_path = os.getenv(IMAGE_CACHE_ENV, "")
+    if not cache_path:
+        return
+    try:
+        data = json.loads(Path(cache_path).read_text(encoding="utf-8"))
+        for key, info in data.items():
+            dev, ino, mtime_ns, size = (int(part) for part in key.split(":"))
+            _IMAGE_INFO_CACHE[(dev, ino, mtime_ns, size)] = tuple(info) if info else None
+    except (OSError, ValueError, TypeError):
+        pass
+
+def save_image_cache():
+    """Guarda solo las entradas usadas en esta ejecución (las de archivos borrados caducan)"""
+    cache_path = os.getenv(IMAGE_CACHE_ENV, "")
+    if not cache_path:
+        return
+    data = {
+        ":".join(str(part) for part in key): _IMAGE_INFO_CACHE[key]
+        for key in _image_keys_used
+    }
+    try:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+def probe_image(path: str, st: os.stat_result) -> Optional[Tuple[str, int, int]]:
+    """Lee solo la cabecera de la imagen; el resultado se cachea por inodo + mtime"""
+    key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    if key in _IMAGE_INFO_CACHE:
+        _image_keys_used.add(key)
+        return _IMAGE_INFO_CACHE[key]
+
+    try:
+        with open(path, "rb") as f:
+            info = parse_image_header(f.read(32))
+            if info is not None and info[0] == "jpeg":
+                size = read_jpeg_size(f)
+                info = ("jpeg", *size) if size else None
+    except struct.error:
+        info = None
+    except OSError:
+        # Un error de lectura puede ser transitorio: no se cachea
+        return None
+
+    _IMAGE_INFO_CACHE[key] = info
+    _image_keys_used.add(key)
+    return info
+
 def parse_java_version(value: str) -> Optional[int]:
     """Convierte una cadena de versión JVM en un entero comparable"""
     if not value:
@@ -157,6 +460,9 @@ def detect_java_version(pom_path: Path) -> Optional[int]:
     versions: List[int] = []
 
     try:
+        # Un pom.xml desmesurado se analiza solo con regex sobre la parte leída
+        if pom_path.stat().st_size > LIMITS["max_file_bytes"]:
+            raise ValueError("pom.xml demasiado grande")
         tree = ET.parse(pom_path)
         root = tree.getroot()
     except Exception:
@@ -193,6 +499,11 @@ def detect_java_version(pom_path: Path) -> Optional[int]:
 # ------------------------------ criterios ------------------------------
 
 IMG_EXTS = [".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp"]
+MIN_IMG_BYTES = 1000
+MIN_IMG_SIDE = 100  # px; por debajo no es una captura legible
+
+# Evidencias descartadas en la última evaluación de C5, con el motivo (se muestran en los comentarios)
+REJECTED_EVIDENCE: List[str] = []
 
 def score_c0_gitflow(root: Path) -> Tuple[float, str, List[str]]:
     """C0: GitFlow correcto (develop + ≥2 features + release v1.0.0 + tag)"""
@@ -317,6 +628,8 @@ def score_c1_backend_api(root: Path) -> Tuple[float, str, List[str]]:
     has_rest_controller = False
 
     for java_file in java_files:
+        if criterion_time_up("backend/"):
+            break
         content = read_file_safe(java_file)
         if not has_entity and "@Entity" in content:
             has_entity = True
@@ -380,6 +693,8 @@ def score_c2_frontend_vaadin(root: Path) -> Tuple[float, str, List[str]]:
     has_http_client = False
 
     for java_file in java_files:
+        if criterion_time_up("frontend/"):
+            break
         content = read_file_safe(java_file)
         if "@Route" in content:
             has_route = True
@@ -424,7 +739,7 @@ def score_c3_tests_backend(root: Path) -> Tuple[float, str, List[str]]:
         return 0.0, "No existe backend/ para ejecutar tests", files_found
 
     test_dir = backend_dir / "src" / "test" / "java"
-    test_files = list(test_dir.rglob("*Test.java")) if test_dir.exists() else []
+    test_files = find_files_by_pattern(test_dir, ["*Test.java"]) if test_dir.exists() else []
     files_found.extend(str(f) for f in test_files)
 
     # Ejecutar mvn test (criterio obligatorio)
@@ -434,12 +749,12 @@ def score_c3_tests_backend(root: Path) -> Tuple[float, str, List[str]]:
             cwd=backend_dir,
             capture_output=True,
             text=True,
-            timeout=180
+            timeout=remaining_criterion_seconds()
         )
     except FileNotFoundError:
         return 0.0, "Maven no está instalado en el runner", files_found
     except subprocess.TimeoutExpired:
-        return 0.0, "Timeout ejecutando mvn test en backend/", files_found
+        return 0.0, f"Timeout ejecutando mvn test en backend/ (límite del criterio: {LIMITS['criterion_seconds']} s)", files_found
 
     if result.returncode != 0:
         issues.append("mvn test falló (revisa logs en target/surefire-reports)")
@@ -454,6 +769,8 @@ def score_c3_tests_backend(root: Path) -> Tuple[float, str, List[str]]:
 
     test_annotations = 0
     for java_file in test_files:
+        if criterion_time_up("backend/src/test/java/"):
+            break
         content = read_file_safe(java_file)
         test_annotations += content.count("@Test")
 
@@ -582,18 +899,33 @@ def score_evidencias(root: Path) -> Tuple[float, str, List[str]]:
     found_images = []
     found_required = set()
     found_bonus = set()
+    REJECTED_EVIDENCE.clear()
     score = 0.0
 
-    all_images = []
-    for ext in IMG_EXTS:
-        all_images.extend(evidencias_dir.glob(f"*{ext}"))
+    # Una única pasada por el directorio; de cada candidata solo se lee la cabecera
+    load_image_cache()
+    with os.scandir(evidencias_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
+
+    for entry in entries:
+        stem, ext = os.path.splitext(entry.name)
+        if ext.lower() not in IMG_EXTS or not entry.is_file():
+            continue
+
+        st = entry.stat()
+        if st.st_size < MIN_IMG_BYTES:
+            continue
 
-    for img_path in all_images:
-        if img_path.stat().st_size < 1000:
+        info = probe_image(entry.path, st)
+        if info is None:
+            REJECTED_EVIDENCE.append(f"{entry.name} (no es una imagen)")
+            continue
+        if min(info[1], info[2]) < MIN_IMG_SIDE:
+            REJECTED_EVIDENCE.append(f"{entry.name} ({info[1]}×{info[2]} px, mín. {MIN_IMG_SIDE})")
             continue
 
-        img_name = img_path.stem.lower()
-        found_images.append(str(img_path))
+        img_name = stem.lower()
+        found_images.append(entry.path)
 
         for req_name, points in required_images.items():
             if validate_evidence_name(img_name, req_name):
@@ -620,7 +952,10 @@ def score_evidencias(root: Path) -> Tuple[float, str, List[str]]:
         comment += f"; faltan: {', '.join(missing_list)}"
     if found_bonus:
         comment += f"; bonus: {', '.join(sorted(found_bonus))}"
+    if REJECTED_EVIDENCE:
+        comment += f"; rechazadas: {', '.join(REJECTED_EVIDENCE[:3])}"
 
+    save_image_cache()
     return score, comment, found_images
 
 def calculate_extra_score(root: Path) -> Tuple[float, str]:
@@ -643,8 +978,13 @@ def calculate_extra_score(root: Path) -> Tuple[float, str]:
 
     frontend_dir = root / "frontend"
     vaadin_files = find_files_by_pattern(frontend_dir, ["**/*.java"]) if frontend_dir.exists() else []
-    vaadin_content = "".join(read_file_safe(f) for f in vaadin_files)
-    if any(component in vaadin_content for component in ["Dialog", "ComboBox", "Binder", "GridPro", "Charts"]):
+    advanced_components = ["Dialog", "ComboBox", "Binder", "GridPro", "Charts"]
+    # Archivo a archivo, parando en el primero que cumpla
+    if any(
+        any(component in read_file_safe(f) for component in advanced_components)
+        for f in vaadin_files
+        if not criterion_time_up("frontend/")
+    ):
         extra_score += 0.5
         improvements.append("UI avanzada en Vaadin")
 
@@ -655,39 +995,342 @@ def calculate_extra_score(root: Path) -> Tuple[float, str]:
 
     return extra_score, comment
 
+# ------------------------------ registro de criterios ------------------------------
+
+CriterionFn = Callable[[Path], Tuple[float, str, List[str]]]
+
+# Código -> (nombre, puntuación máxima, función de evaluación)
+CRITERIA: Dict[str, Tuple[str, float, CriterionFn]] = {
+    "C0": ("GitFlow", 1.0, score_c0_gitflow),
+    "C1": ("Backend API", 2.0, score_c1_backend_api),
+    "C2": ("Frontend Vaadin", 2.0, score_c2_frontend_vaadin),
+    "C3": ("Tests backend", 2.0, score_c3_tests_backend),
+    "C4": ("Docker & CI", 2.0, score_c4_docker_ci),
+    "C5": ("Evidencias", 1.0, score_evidencias),
+}
+
+# Criterios que no entran en --static (ejecutan mvn test)
+SLOW_CRITERIA = {"C3"}
+
+def select_criteria(only: Optional[str] = None, static: bool = False) -> List[str]:
+    """Devuelve los códigos de criterio a evaluar según --only / --static"""
+    selected = list(CRITERIA)
+    if only:
+        requested = {code.strip().upper() for code in only.split(",") if code.strip()}
+        unknown = requested - set(CRITERIA)
+        if unknown:
+            raise ValueError(f"criterios desconocidos: {', '.join(sorted(unknown))} (válidos: {', '.join(CRITERIA)})")
+        selected = [code for code in selected if code in requested]
+    if static:
+        selected = [code for code in selected if code not in SLOW_CRITERIA]
+    if not selected:
+        raise ValueError("la selección de criterios está vacía (revisa --only/--static)")
+    return selected
+
+# ------------------------------ modo lote ------------------------------
+
+def run_git(args: List[str], cwd: Optional[Path] = None, timeout: int = 600) -> subprocess.CompletedProcess:
+    """Ejecuta un comando git capturando la salida"""
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        timeout=timeout
+    )
+
+def resolve_repo_url(url: str) -> str:
+    """Los repositorios bare locales se referencian por ruta absoluta (git se ejecuta en la caché)"""
+    if Path(url).exists():
+        return str(Path(url).resolve())
+    return url
+
+# El usuario se usa como nombre de directorio dentro de la caché
+BATCH_USER_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+
+def read_batch_list(path: Path) -> List[Tuple[str, str]]:
+    """
+    Lee la lista de repositorios: "URL" o "usuario URL" por línea (# para comentarios).
+    El usuario da nombre al espejo y al worktree, por lo que debe ser un nombre de
+    directorio seguro y no puede repetirse.
+    """
+    entries: List[Tuple[str, str]] = []
+    seen: Dict[str, int] = {}
+    for line_no, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        parts = line.split()
+        url = parts[-1]
+        if len(parts) >= 2:
+            usuario = parts[0]
+        else:
+            repo_short = re.sub(r"\.git$", "", url.rstrip("/").split("/")[-1].split(":")[-1])
+            usuario = clean_repo_name(repo_short)
+
+        url = resolve_repo_url(url)
+
+        if not BATCH_USER_RE.match(usuario) or usuario in (".", ".."):
+            raise ValueError(
+                f"{path}:{line_no}: usuario '{usuario}' no válido (solo letras, dígitos, '.', '_' y '-'); "
+                f"usa el formato 'usuario URL'"
+            )
+        if usuario in seen:
+            raise ValueError(
+                f"{path}:{line_no}: usuario '{usuario}' repetido (ya aparece en la línea {seen[usuario]}); "
+                f"usa el formato 'usuario URL' para distinguirlos"
+            )
+        seen[usuario] = line_no
+
+        entries.append((usuario, url))
+    return entries
+
+def ensure_shared_store(cache_dir: Path, seed_url: str) -> Path:
+    """Crea o actualiza el almacén de objetos compartido con la historia de la plantilla"""
+    store = cache_dir / "store.git"
+    if not store.exists():
+        run_git(["init", "--bare", "-q", str(store)])
+        # Los espejos dependen de estos objetos: nunca se recolectan ni se podan
+        run_git(["config", "gc.auto", "0"], cwd=store)
+        run_git(["config", "gc.pruneExpire", "never"], cwd=store)
+
+    result = run_git(["fetch", "-q", "--no-tags", seed_url, "+refs/heads/*:refs/plantilla/*"], cwd=store)
+    if result.returncode != 0:
+        error = result.stderr.strip()[-200:]
+        # Sin plantilla cada espejo copiaría la historia completa: no tiene sentido continuar
+        seeded = run_git(["for-each-ref", "--count=1", "refs/plantilla/"], cwd=store)
+        if not seeded.stdout.strip():
+            raise RuntimeError(f"No se pudo sembrar el almacén compartido desde {seed_url}: {error}")
+        print(f"⚠️ No se pudo actualizar el almacén compartido desde {seed_url} (se usa la copia anterior): {error}")
+    return store
+
+def sync_mirror(cache_dir: Path, store: Path, usuario: str, url: str) -> Path:
+    """Clona o actualiza de forma incremental el espejo bare del alumno sobre el almacén compartido"""
+    mirror = cache_dir / "mirrors" / f"{usuario}.git"
+    refspecs = ["+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"]
+
+    if mirror.exists():
+        result = run_git(["fetch", "-q", "--prune", url, *refspecs], cwd=mirror)
+    else:
+        mirror.parent.mkdir(parents=True, exist_ok=True)
+        # --no-local fuerza el protocolo git también para rutas locales, de modo que
+        # --reference se respete y solo se copien los objetos que no están en el almacén
+        result = run_git(["clone", "-q", "--bare", "--no-local", "--reference", str(store), url, str(mirror)])
+
+    if result.returncode != 0:
+        raise RuntimeError(f"git falló con {url}: {result.stderr.strip()[-300:]}")
+    return mirror
+
+def prepare_worktree(cache_dir: Path, mirror: Path, usuario: str) -> Path:
+    """
+    Crea un worktree desacoplado del HEAD del espejo (solo ficheros, sin copiar objetos).
+    Si ya existe se actualiza en el sitio: los archivos sin cambios conservan inodo y
+    mtime, de modo que la caché de imágenes sigue siendo válida.
+    """
+    worktree = cache_dir / "work" / usuario
+    # Nunca borrar nada que no sea un worktree directo de cache/work/
+    if worktree.resolve().parent != (cache_dir / "work").resolve():
+        raise RuntimeError(f"Ruta de worktree no válida para '{usuario}': {worktree}")
+
+    if (worktree / ".git").exists():
+        head = run_git(["rev-parse", "HEAD"], cwd=mirror)
+        if head.returncode == 0:
+            checkout = run_git(["checkout", "-q", "--force", "--detach", head.stdout.strip()], cwd=worktree)
+            clean = run_git(["clean", "-q", "-ffdx"], cwd=worktree)
+            if checkout.returncode == 0 and clean.returncode == 0:
+                return worktree
+
+    if worktree.exists():
+        run_git(["worktree", "remove", "--force", str(worktree)], cwd=mirror)
+        shutil.rmtree(worktree, ignore_errors=True)
+    run_git(["worktree", "prune"], cwd=mirror)
+
+    worktree.parent.mkdir(parents=True, exist_ok=True)
+    result = run_git(["worktree", "add", "-q", "--force", "--detach", str(worktree), "HEAD"], cwd=mirror)
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo crear el worktree: {result.stderr.strip()[-300:]}")
+    return worktree
+
+def limit_args() -> List[str]:
+    """Argumentos para propagar los límites actuales a un proceso evaluador"""
+    return [
+        "--max-file-kb", str(LIMITS["max_file_bytes"] // KB),
+        "--max-total-mb", str(LIMITS["max_total_bytes"] // MB),
+        "--max-entries", str(LIMITS["max_entries"]),
+        "--criterion-timeout", str(LIMITS["criterion_seconds"]),
+    ]
+
+def kill_process_tree(proc: subprocess.Popen):
+    """Mata el proceso y sus hijos (mvn, git...) lanzados en su misma sesión"""
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def grade_worktree(worktree: Path, usuario: str, image_cache: Optional[Path] = None) -> List[str]:
+    """
+    Evalúa un worktree ejecutando este mismo script en un proceso aparte.
+    El watchdog lo mata (con sus hijos) si supera LIMITS["worker_seconds"];
+    el resto de alumnos sigue evaluándose.
+    """
+    env = dict(os.environ, P15_USUARIO=usuario)
+    if image_cache is not None:
+        env[IMAGE_CACHE_ENV] = str(image_cache)
+    proc = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), *limit_args()],
+        cwd=worktree,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+        start_new_session=True
+    )
+    try:
+        stdout, stderr = proc.communicate(timeout=LIMITS["worker_seconds"])
+    except subprocess.TimeoutExpired:
+        kill_process_tree(proc)
+        proc.communicate()
+        raise RuntimeError(f"watchdog: evaluación cancelada tras {LIMITS['worker_seconds']} s")
+
+    csv_path = worktree / "resultados.csv"
+    if proc.returncode != 0 or not csv_path.exists():
+        raise RuntimeError(f"El evaluador falló: {(stdout + stderr).strip()[-300:]}")
+
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    return rows[-1]
+
+def process_batch_entry(cache_dir: Path, store: Path, usuario: str, url: str) -> List[str]:
+    """Espejo + worktree + evaluación de un alumno; los errores se reflejan en su fila"""
+    try:
+        mirror = sync_mirror(cache_dir, store, usuario, url)
+        worktree = prepare_worktree(cache_dir, mirror, usuario)
+        return grade_worktree(worktree, usuario, cache_dir / "images" / f"{usuario}.json")
+    except subprocess.TimeoutExpired:
+        return [usuario, PRACTICA, "0.0", "Error: timeout sincronizando el repositorio"]
+    except Exception as e:
+        return [usuario, PRACTICA, "0.0", f"Error: {str(e)}"]
+
+def run_batch(list_path: Path, cache_dir: Path, jobs: int, seed_url: Optional[str] = None):
+    """Evalúa todos los repositorios de la lista reutilizando la caché de espejos"""
+    entries = read_batch_list(list_path)
+    if not entries:
+        print(f"⚠️ La lista {list_path} no contiene repositorios")
+        return
+
+    cache_dir = cache_dir.resolve()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    store = ensure_shared_store(cache_dir, resolve_repo_url(seed_url) if seed_url else entries[0][1])
+
+    print(f"🔍 Evaluando {len(entries)} repositorios de {PRACTICA} ({jobs} en paralelo)")
+    print(f"📦 Caché de espejos: {cache_dir}")
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        rows = list(executor.map(lambda entry: process_batch_entry(cache_dir, store, *entry), entries))
+
+    with open("resultados.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(CSV_HEADERS)
+        w.writerows(rows)
+
+    for row in rows:
+        print(f"  {row[0]:<25} {row[2]:>5}  {row[3][:80]}")
+    print(f"✅ {len(rows)} resultados guardados en resultados.csv")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=f"Evaluador {PRACTICA}")
+    parser.add_argument("--batch", metavar="LISTA", type=Path,
+                        help="fichero con los repositorios a evaluar (URL o 'usuario URL' por línea)")
+    parser.add_argument("--plantilla", metavar="URL",
+                        help="repositorio plantilla con el que se siembra el almacén compartido")
+    parser.add_argument("--cache", metavar="DIR", type=Path, default=Path(BATCH_CACHE_DIR),
+                        help=f"directorio de la caché de espejos (por defecto {BATCH_CACHE_DIR})")
+    parser.add_argument("--jobs", type=int, default=min(8, os.cpu_count() or 1),
+                        help="repositorios procesados en paralelo en modo lote")
+    parser.add_argument("--only", metavar="C1,C4",
+                        help="evalúa solo los criterios indicados (nota parcial, no escribe resultados.csv)")
+    parser.add_argument("--static", action="store_true",
+                        help="evalúa todo salvo los criterios que ejecutan mvn test (nota parcial)")
+    parser.add_argument("--max-file-kb", type=int, default=LIMITS["max_file_bytes"] // KB,
+                        help="tamaño máximo leído de cada archivo; los mayores se leen parcialmente")
+    parser.add_argument("--max-total-mb", type=int, default=LIMITS["max_total_bytes"] // MB,
+                        help="bytes totales leídos por repositorio")
+    parser.add_argument("--max-entries", type=int, default=LIMITS["max_entries"],
+                        help="archivos + directorios recorridos como máximo en todo el repositorio")
+    parser.add_argument("--criterion-timeout", type=int, default=LIMITS["criterion_seconds"],
+                        help="segundos por criterio (búsqueda, lectura y mvn test en C3)")
+    parser.add_argument("--worker-timeout", type=int, default=LIMITS["worker_seconds"],
+                        help="segundos antes de que el watchdog mate la evaluación de un alumno (modo lote)")
+    args = parser.parse_args(argv)
+
+    if args.batch and (args.only or args.static):
+        parser.error("--only/--static no se pueden combinar con --batch")
+    try:
+        args.criteria = select_criteria(args.only, args.static)
+    except ValueError as e:
+        parser.error(str(e))
+
+    LIMITS["max_file_bytes"] = max(1, args.max_file_kb) * KB
+    LIMITS["max_total_bytes"] = max(1, args.max_total_mb) * MB
+    LIMITS["max_entries"] = max(1, args.max_entries)
+    LIMITS["criterion_seconds"] = max(1, args.criterion_timeout)
+    LIMITS["worker_seconds"] = max(1, args.worker_timeout)
+    return args
+
 def main():
+    args = parse_args()
+    if args.batch:
+        run_batch(args.batch, args.cache, max(1, args.jobs), args.plantilla)
+        return None
+
     root = get_repo_root()
     usuario = extract_github_user()
+    _scan_state["repo_root"] = Path(os.path.abspath(root))
 
     print(f"🔍 Evaluando P15 para usuario: {usuario}")
     print(f"📁 Directorio raíz: {root}")
 
-    # Evaluar criterios
-    c0_score, c0_comment, c0_files = score_c0_gitflow(root)
-    c1_score, c1_comment, c1_files = score_c1_backend_api(root)
-    c2_score, c2_comment, c2_files = score_c2_frontend_vaadin(root)
-    c3_score, c3_comment, c3_files = score_c3_tests_backend(root)
-    c4_score, c4_comment, c4_files = score_c4_docker_ci(root)
-
-    # Evidencias (C5)
-    ev_score, ev_comment, ev_files = score_evidencias(root)
-
-    # Extra
-    extra_score, extra_comment = calculate_extra_score(root)
+    # Evaluar criterios seleccionados
+    results: Dict[str, Tuple[float, str, List[str]]] = {}
+    for code in args.criteria:
+        start_criterion_budget()
+        results[code] = CRITERIA[code][2](root)
+    skipped = [code for code in CRITERIA if code not in results]
+    partial = bool(skipped)
+
+    # Extra solo cuenta en la nota completa: sumado a una parcial la desbordaría
+    if partial:
+        extra_score, extra_comment = 0.0, "Extra: omitido"
+    else:
+        start_criterion_budget()
+        extra_score, extra_comment = calculate_extra_score(root)
 
-    base_score = c0_score + c1_score + c2_score + c3_score + c4_score + ev_score
+    base_score = sum(score for score, _, _ in results.values())
+    max_score = sum(CRITERIA[code][1] for code in results)
     total_score = min(10.0, base_score + extra_score)
 
-    comments = [
-        f"C0 GitFlow: {c0_score:.1f}/1.0",
-        f"C1 Backend API: {c1_score:.1f}/2.0",
-        f"C2 Frontend Vaadin: {c2_score:.1f}/2.0",
-        f"C3 Tests backend: {c3_score:.1f}/2.0",
-        f"C4 Docker & CI: {c4_score:.1f}/2.0",
-        f"C5 Evidencias: {ev_score:.1f}/1.0"
-    ]
+    comments = []
+    for code, (label, max_points, _) in CRITERIA.items():
+        if code in results:
+            comments.append(f"{code} {label}: {results[code][0]:.1f}/{max_points:.1f}")
+        else:
+            comments.append(f"{code} {label}: omitido")
     if extra_score > 0:
         comments.append(f"Extra: +{extra_score:.1f}/2.0")
+    if REJECTED_EVIDENCE:
+        rejected_text = ", ".join(REJECTED_EVIDENCE[:3])
+        if len(REJECTED_EVIDENCE) > 3:
+            rejected_text += f" (+{len(REJECTED_EVIDENCE) - 3} más)"
+        comments.append(f"Evidencias rechazadas: {rejected_text}")
+    if RESOURCE_ISSUES:
+        limit_text = ", ".join(RESOURCE_ISSUES[:3])
+        if len(RESOURCE_ISSUES) > 3:
+            limit_text += f" (+{len(RESOURCE_ISSUES) - 3} más)"
+        comments.append(f"Límites: {limit_text}")
 
     final_comment = "; ".join(comments)
 
@@ -696,20 +1339,22 @@ def main():
     print("="*60)
     print(f"👤 Usuario: {usuario}")
     print(f"🎯 Práctica: {PRACTICA}")
-    print(f"📈 Nota: {total_score:.1f}/10.0")
+    if partial:
+        print(f"📈 Nota parcial: {total_score:.1f}/{max_score:.1f} (omitidos: {', '.join(skipped)})")
+    else:
+        print(f"📈 Nota: {total_score:.1f}/10.0")
     print("\n📋 Detalle por criterios:")
-    print(f"  C0 - GitFlow:         {c0_score:.1f}/1.0")
-    print(f"  C1 - Backend API:     {c1_score:.1f}/2.0")
-    print(f"  C2 - Frontend Vaadin: {c2_score:.1f}/2.0")
-    print(f"  C3 - Tests backend:   {c3_score:.1f}/2.0")
-    print(f"  C4 - Docker & CI:     {c4_score:.1f}/2.0")
-    print(f"  C5 - Evidencias:      {ev_score:.1f}/1.0")
+    for code, (label, max_points, _) in CRITERIA.items():
+        if code in results:
+            print(f"  {code} - {label + ':':<17}{results[code][0]:.1f}/{max_points:.1f}")
+        else:
+            print(f"  {code} - {label + ':':<17}⏭️  omitido")
     if extra_score > 0:
         print(f"  ⭐ Extra:            +{extra_score:.1f}/2.0 (máx 10 total)")
 
     print(f"\n💬 Comentarios: {final_comment}")
 
-    all_files = set(c0_files + c1_files + c2_files + c3_files + c4_files + ev_files)
+    all_files = set(path for _, _, files in results.values() for path in files)
     if all_files:
         print(f"\n📁 Archivos evaluados ({len(all_files)}):")
         for file_path in sorted(all_files)[:10]:
@@ -719,9 +1364,14 @@ def main():
 
     print("\n" + "="*60)
 
+    # Una nota parcial no debe sustituir a la nota oficial del CSV
+    if partial:
+        print("ℹ️ Evaluación parcial: no se escribe resultados.csv (ejecuta sin --only/--static para la nota completa)")
+        return None
+
     write_csv_row(
         "resultados.csv",
-        ["Usuario GitHub", "Practica", "Nota", "Comentarios"],
+        CSV_HEADERS,
         [usuario, PRACTICA, f"{total_score:.1f}", final_comment],
         append=False
     )
@@ -732,7 +1382,7 @@ def main():
 if __name__ == "__main__":
     try:
         exit_code = main()
-        if exit_code < 5:
+        if exit_code is not None and exit_code < 5:
             print("⚠️ Nota inferior a 5.0; el CSV se ha generado igualmente.")
         sys.exit(0)
     except Exception as e: